@@ -21,15 +21,30 @@ Why it’s student-friendly
 - Inputs can come from --values, a file, or stdin (one per line).
 - You can select the line by wavelength (preferred) or by INSPECT’s "wi" index.
 - Live progress prints: "1/3 ... DONE" with the key outputs.
-- Gentle retries and throttling to avoid hammering the site.
+- Each CSV row is written as soon as its result is in, so an interrupted
+  batch keeps everything finished so far.
+- Several queries run in parallel (bounded by --concurrency) for speed.
+- Gentle retries (jittered backoff, honours Retry-After) and optional throttling.
 - Errors never crash the batch; they show up as a row with an "error" message.
 
 Requirements
 ------------
 Python 3.8+
-pip install: requests, beautifulsoup4, urllib3
+pip install: requests, urllib3, numpy
 
-    pip install requests beautifulsoup4 urllib3
+    pip install requests urllib3 numpy
+
+Optional, for --http2:
+
+    pip install "httpx[http2]"
+
+Optional, faster cache files:
+
+    pip install orjson
+
+Optional, fallback parser if INSPECT's line dropdown changes format:
+
+    pip install beautifulsoup4 lxml
 
 Quick examples
 --------------
@@ -72,7 +87,12 @@ Input values:
 
 Output & control:
   --out             Output CSV file path (default: stdout)
-  --sleep           Pause [s] between requests (default 0.2, be polite!)
+  --sleep           Minimum pause [s] after each request, per worker (default 0)
+  --concurrency     Number of queries in flight at once (default 10)
+  --http2           Use HTTP/2 (via the optional httpx package) to multiplex queries
+  --pin-ip          Resolve the INSPECT host once and reuse that IP for every connection
+  --cache           Reuse (and store) results of identical queries from earlier runs
+  --lines-ttl       Seconds to reuse the cached line list (default 86400; 0 = always refetch)
   --quiet           Suppress progress prints (only final CSV output)
   --clip            Clip out-of-range values to INSPECT’s allowed parameter ranges
 
@@ -81,61 +101,312 @@ Outputs
 -------
 - A progress line per input, e.g.:
   [1/3] mode=ew val=65 => A_LTE=8.778  A_NLTE=8.582  Δ=-0.196  [O/Fe]_NLTE=-0.118  ... DONE
-- A CSV summary to --out (or stdout if --out omitted).
+- A CSV summary to --out (or stdout if --out omitted), written row by row.
+  When the CSV goes to stdout, progress prints go to stderr.
 
 Notes
 -----
 - INSPECT enforces parameter ranges (e.g., Teff 5000–6500 K for O I example).
   If a query is out of range, you’ll see an "error" column in that row.
-- Use --sleep to be polite. Default 0.2 s between queries is usually fine.
+- The number of parallel queries is capped by --concurrency, and HTTP 429
+  ("too many requests") answers are retried with randomized backoff.
+  Add --sleep (e.g. 0.2) if you want to slow things down further.
+- The line list of each element is cached as JSON in ~/.cache/abundatron
+  (or $XDG_CACHE_HOME/abundatron) for a day (see --lines-ttl), saving one page load per run.
+- Repeated inputs are only queried once per run. With --cache, successful
+  results are also kept in ~/.cache/abundatron/results.sqlite so identical
+  queries in later runs are answered without contacting INSPECT. Cached
+  results never expire; delete that file if INSPECT's grids are updated.
 """
 
+import os
 import sys
 import csv
 import re
+import json
+import html
 import math
 import time
+import random
+import hashlib
 import argparse
+import functools
+import socket
+import sqlite3
+import warnings
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import takewhile
+from urllib.parse import urlsplit, urlunsplit
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple, Union
+from typing import Iterator, List, Dict, Optional, TextIO, Tuple, Union
 
+import numpy as np
 import requests
 from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InvalidHeader
 from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup
+try:
+    import orjson   # optional, faster (de)serialization for the on-disk caches
+except ImportError:
+    orjson = None
+
+try:
+    import httpx    # optional, only needed for --http2 (pip install "httpx[http2]")
+except ImportError:
+    httpx = None
 
 BASE = "https://www.inspect-stars.com"
 ENDPOINT_EW   = f"{BASE}/A_from_e"
 ENDPOINT_LTE  = f"{BASE}/nonlte_from_lte"
 
+# Line lists (the "wi" dropdown) rarely change, so they are cached on disk,
+# as are query results if asked to (see --cache)
+# in a per-user directory, so other users cannot plant or read entries
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "abundatron"
+LINES_CACHE_TTL = 24 * 3600   # seconds
+RESULTS_DB = CACHE_DIR / "results.sqlite"
+
 # ---------- HTTP session with retries ----------
-def make_session() -> requests.Session:
+RETRY_TOTAL = 5                                 # up to 5 retries for robustness
+RETRY_BACKOFF_FACTOR = 0.5                      # exponential backoff: 0.5, 1.0, 2.0, ... (+ jitter)
+RETRY_BACKOFF_MAX = 30.0                        # seconds
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def jittered_backoff(errors: int, backoff_factor: float = RETRY_BACKOFF_FACTOR) -> float:
+    """Seconds to wait after `errors` consecutive failures: exponential plus up to 1 s of jitter."""
+    if errors == 0:
+        return 0.0
+    return min(RETRY_BACKOFF_MAX, backoff_factor * 2 ** (errors - 1) + random.random())
+
+class JitteredRetry(Retry):
+    """
+    urllib3 Retry with randomized exponential backoff.
+
+    The stock backoff is deterministic (and zero before the first retry), so
+    parallel workers that hit a 429 together would all retry together. Here
+    each wait is backoff_factor * 2**(n-1) plus up to one second of random
+    jitter, capped at RETRY_BACKOFF_MAX. A Retry-After header still takes
+    precedence (handled by Retry.sleep).
+    """
+    def get_backoff_time(self) -> float:
+        # Only count the latest run of consecutive errors (ignore redirects), like urllib3
+        errors = len(list(takewhile(lambda x: x.redirect_location is None, reversed(self.history))))
+        return jittered_backoff(errors, self.backoff_factor)
+
+class PinnedIPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that connects to a fixed IP address for one host name, so no
+    DNS lookup is made per new connection. The Host header, TLS SNI and the
+    certificate check still use the host name.
+    """
+    def __init__(self, host: str, ip: str, **kwargs):
+        self.host = host
+        self.ip = ip
+        super().__init__(**kwargs)   # calls init_poolmanager, so set host first
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["server_hostname"] = self.host
+        kwargs["assert_hostname"] = self.host
+        super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.hostname != self.host:
+            return super().send(request, **kwargs)
+        # Rewrite a copy so the caller's request (and r.url, error messages) keep the host name
+        pinned = request.copy()
+        pinned.headers["Host"] = parts.netloc
+        netloc = self.ip if parts.port is None else f"{self.ip}:{parts.port}"
+        pinned.url = urlunsplit(parts._replace(netloc=netloc))
+        response = super().send(pinned, **kwargs)
+        response.url = request.url
+        response.request = request
+        return response
+
+def make_session(pool_size: int = 10, pinned_ip: Optional[str] = None) -> requests.Session:
     """
     Create a requests session that automatically retries common transient errors.
+
+    All queries go to the single INSPECT host, so one connection pool is kept
+    with room for `pool_size` keep-alive connections (one per worker). Reusing
+    them saves a TCP + TLS handshake on every query after the first.
+    If `pinned_ip` is given, connections to the INSPECT host go to that
+    address without further DNS lookups (see PinnedIPAdapter).
     """
     s = requests.Session()
-    retry = Retry(
-        total=5,                # up to 5 retries for robustness
-        backoff_factor=0.5,     # exponential backoff: 0.5, 1.0, 2.0, ...
-        status_forcelist=(429, 500, 502, 503, 504),
+    retry = JitteredRetry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
         allowed_methods=["GET"]
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter_kwargs = dict(
+        max_retries=retry,
+        pool_connections=1,             # only one host is ever contacted
+        pool_maxsize=max(10, pool_size),
+        pool_block=True,                # wait for a free connection instead of opening throwaway ones
+    )
+    adapter = HTTPAdapter(**adapter_kwargs)
     s.mount("https://", adapter)
     s.mount("http://", adapter)
-    s.headers.update({"User-Agent": "inspect-batch-scraper/1.1 (python requests)"})
+    if pinned_ip:
+        # The longest matching prefix wins, so only INSPECT URLs use the pinned adapter
+        s.mount(BASE, PinnedIPAdapter(urlsplit(BASE).hostname, pinned_ip, **adapter_kwargs))
+    s.headers.update({
+        "User-Agent": "inspect-batch-scraper/1.1 (python requests)",
+        "Connection": "keep-alive",
+    })
     return s
 
+if httpx is not None:
+    class RetryingTransport(httpx.HTTPTransport):
+        """
+        httpx transport with the same retry policy as make_session(): retry
+        connection errors and RETRY_STATUSES up to RETRY_TOTAL times with
+        jittered_backoff(). As in urllib3, a Retry-After header (seconds or an
+        HTTP date) on a 413/429/503 answer is honoured in full instead.
+        """
+        def handle_request(self, request):
+            for attempt in range(1, RETRY_TOTAL + 2):
+                try:
+                    response = super().handle_request(request)
+                except httpx.TransportError:
+                    if attempt > RETRY_TOTAL:
+                        raise
+                    time.sleep(jittered_backoff(attempt))
+                    continue
+                if response.status_code not in RETRY_STATUSES or attempt > RETRY_TOTAL:
+                    return response
+                wait = jittered_backoff(attempt)
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and response.status_code in Retry.RETRY_AFTER_STATUS_CODES:
+                    try:
+                        wait = Retry().parse_retry_after(retry_after)
+                    except InvalidHeader:
+                        pass
+                response.close()
+                time.sleep(wait)
+
+def make_http2_client(max_connections: int = 10) -> "httpx.Client":
+    """
+    Create an httpx client that speaks HTTP/2, as an alternative to make_session().
+
+    Over HTTP/2 all worker threads share one connection and their requests
+    are multiplexed on it. The client supports the calls this script makes
+    (get, stream, raise_for_status), so it can be passed wherever a session is.
+    """
+    if httpx is None:
+        raise RuntimeError('--http2 needs httpx: pip install "httpx[http2]"')
+    # http2/limits must go on the transport: httpx ignores them on the client when one is passed
+    transport = RetryingTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=1, max_connections=max_connections),
+    )
+    return httpx.Client(
+        transport=transport,
+        timeout=30,
+        headers={"User-Agent": "inspect-batch-scraper/1.1 (python httpx)"},
+    )
+
+# ---------- Cache files ----------
+def make_cache_dir() -> Path:
+    """Create CACHE_DIR (private to the current user) if needed and return it."""
+    CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return CACHE_DIR
+
+def owned_by_me(st: os.stat_result) -> bool:
+    """True if a cache file belongs to the current user (always true where uids do not exist)."""
+    return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+def json_dumps(obj) -> bytes:
+    """Serialize `obj` to JSON bytes, with orjson if it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def json_loads(data: Union[bytes, str]):
+    """Inverse of json_dumps()."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 # ---------- Helpers to fetch available lines and map wavelength -> wi ----------
-def fetch_available_lines(element: str, session: requests.Session) -> List[Tuple[int, float, str]]:
+def cached_lines(func):
     """
-    Load the calculator page and parse <select name="wi"> options.
-    Returns a list of (wi_index, wavelength_A, label_text).
+    Memoize a line-list fetcher `func(element, session)`.
+
+    Results are kept in-process (so repeated lookups in one run parse the page
+    only once) and as JSON under CACHE_DIR, reused for `ttl` seconds by
+    later runs. A `ttl` of 0 always refetches. Cache I/O problems are ignored.
     """
-    # Using the LTE endpoint just to access the wavelength dropdown.
-    r = session.get(f"{ENDPOINT_LTE}?element_name={element}", timeout=20)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+    @functools.lru_cache(maxsize=None)
+    @functools.wraps(func)
+    def wrapper(element: str, session: requests.Session, ttl: float = LINES_CACHE_TTL):
+        digest = hashlib.sha1(repr((element,)).encode()).hexdigest()[:16]
+        path = CACHE_DIR / f"lines_{digest}.json"
+        if ttl > 0:
+            try:
+                st = path.stat()
+                # A file from another user, or dated in the future, is never trusted
+                if owned_by_me(st) and 0 <= time.time() - st.st_mtime < ttl:
+                    return [(int(wi), math.nan if wav is None else float(wav), str(txt))
+                            for wi, wav, txt in json_loads(path.read_bytes())]
+            except (OSError, ValueError, TypeError):
+                pass    # missing, stale or unreadable cache: fall through and refetch
+        lines = func(element, session)
+        try:
+            make_cache_dir()
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            # NaN is not valid JSON, so unparsable wavelengths are stored as null
+            tmp.write_bytes(json_dumps([[wi, None if math.isnan(wav) else wav, txt] for wi, wav, txt in lines]))
+            os.replace(tmp, path)   # atomic, so parallel runs never see a partial file
+        except OSError:
+            pass
+        return lines
+    return wrapper
+
+SELECT_WI_RE = re.compile(rb"""<select[^>]*\bname=["']?wi\b[^>]*>(.*?)</select""", re.S | re.I)
+OPT_RE       = re.compile(rb"""<option[^>]*\bvalue=["']?(\d+)["']?[^>]*>([^<]*)<""", re.I)
+LEADING_FLOAT_RE = re.compile(r"\s*(\d+(?:\.\d+)?)")
+
+def label_wavelength(label: str) -> float:
+    """Wavelength [Å] from a dropdown label such as "7771.944 [O I]"; NaN if it has none."""
+    m = LEADING_FLOAT_RE.match(label)
+    return float(m.group(1)) if m else math.nan
+
+def parse_line_options(content: bytes) -> List[Tuple[int, float, str]]:
+    """
+    Fast path: pull (wi_index, wavelength_A, label_text) out of the
+    <select name="wi"> dropdown with two regexes. Returns [] if the markup
+    does not look as expected.
+    """
+    sel = SELECT_WI_RE.search(content)
+    if not sel:
+        return []
+    lines = []
+    for wi, label in OPT_RE.findall(sel.group(1)):
+        txt = html.unescape(label.decode("utf-8", "replace")).strip()
+        lines.append((int(wi), label_wavelength(txt), txt))
+    return lines
+
+def parse_line_options_soup(content: bytes, element: str) -> List[Tuple[int, float, str]]:
+    """
+    Fallback for parse_line_options() using a real HTML parser (BeautifulSoup,
+    with lxml if installed). Imported lazily, as it is rarely needed.
+    """
+    try:
+        from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+    except ImportError:
+        raise RuntimeError(f"Could not read the line list for element {element}; "
+                           "install beautifulsoup4 (and lxml) for the fallback parser.")
+
+    # Only build a tree for the dropdown; lxml is much faster than html.parser
+    strainer = SoupStrainer("select", attrs={"name": "wi"})
+    try:
+        soup = BeautifulSoup(content, "lxml", parse_only=strainer)
+    except FeatureNotFound:
+        soup = BeautifulSoup(content, "html.parser", parse_only=strainer)
     sel = soup.find("select", attrs={"name": "wi"})
     if not sel:
         raise RuntimeError(f"Could not find wavelength selector for element {element}.")
@@ -149,32 +420,83 @@ def fetch_available_lines(element: str, session: requests.Session) -> List[Tuple
             wi = int(val)
         except ValueError:
             continue
-        try:
-            wav = float(txt)
-        except ValueError:
-            wav = math.nan
-        lines.append((wi, wav, txt))
+        lines.append((wi, label_wavelength(txt), txt))
+    return lines
+
+@cached_lines
+def fetch_available_lines(element: str, session: requests.Session) -> List[Tuple[int, float, str]]:
+    """
+    Load the calculator page and parse <select name="wi"> options.
+    Returns a list of (wi_index, wavelength_A, label_text).
+    """
+    # Using the LTE endpoint just to access the wavelength dropdown.
+    r = session.get(f"{ENDPOINT_LTE}?element_name={element}", timeout=20)
+    r.raise_for_status()
+    lines = parse_line_options(r.content)
+    if not lines:
+        # Unexpected markup (e.g. the page layout changed): use a real HTML parser
+        lines = parse_line_options_soup(r.content, element)
     if not lines:
         raise RuntimeError(f"No lines found for element {element}.")
     return lines
 
-def choose_wi_from_wavelength(element: str, wavelength: float, session: requests.Session) -> Tuple[int, float]:
+@functools.lru_cache(maxsize=None)
+def line_index(element: str, session: requests.Session, ttl: float = LINES_CACHE_TTL
+               ) -> Tuple[np.ndarray, np.ndarray, Dict[float, Tuple[int, float]]]:
+    """
+    Lookup structures for the element's line list, built once per run on top
+    of the cached fetch_available_lines():
+      (wi_indices, wavelengths_A) as NumPy arrays for nearest-line searches, and
+      {round(wavelength_A, 3): (wi_index, wavelength_A)} for O(1) exact hits.
+    """
+    lines = fetch_available_lines(element, session, ttl)
+    wis = np.array([wi for wi, _, _ in lines], dtype=np.int32)
+    wavs = np.array([wav for _, wav, _ in lines], dtype=np.float64)
+    # Reversed so that, as in the nearest search, the first listed line wins a tie
+    by_wav = {round(wav, 3): (wi, wav) for wi, wav, _ in reversed(lines) if not math.isnan(wav)}
+    return wis, wavs, by_wav
+
+def choose_wi_from_wavelength(element: str, wavelength: float, session: requests.Session,
+                              ttl: float = LINES_CACHE_TTL) -> Tuple[int, float]:
     """
     Map a wavelength to INSPECT's 'wi' index.
     Prefers exact match; otherwise chooses the nearest wavelength.
     Returns (wi_index, matched_wavelength_A).
     """
-    lines = fetch_available_lines(element, session)
-    for wi, wav, _ in lines:
-        if not math.isnan(wav) and abs(wav - wavelength) < 1e-6:
-            return wi, wav
-    nearest = min(lines, key=lambda t: abs(t[1] - wavelength) if not math.isnan(t[1]) else float("inf"))
-    return nearest[0], nearest[1]
+    wis, wavs, by_wav = line_index(element, session, ttl)
+    hit = by_wav.get(round(wavelength, 3))
+    if hit is not None:
+        return hit
+    diff = np.abs(wavs - wavelength)
+    if np.isnan(diff).all():
+        raise RuntimeError(f"No line wavelengths available for element {element}.")
+    # nanargmin picks the first minimum, so an exact match (diff ~ 0) always wins
+    idx = int(np.nanargmin(diff))
+    return int(wis[idx]), float(wavs[idx])
 
 # ---------- Parsing the <pre> block ----------
 FLOAT_RE = re.compile(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+PRE_RE   = re.compile(rb"<pre[^>]*>(.*?)</pre>", re.S | re.I)
+TAG_RE   = re.compile(r"<[^>]+>")
+# One whole line of 3-5 whitespace-separated numbers (the result row)
+ROW_RE   = re.compile(rb"(?m)^[ \t]*([-+]?\d[\d.eE+-]*(?:[ \t]+[-+]?\d[\d.eE+-]*){2,4})[ \t]*\r?$")
 
-def parse_pre_block(html: str) -> Dict[str, float]:
+def row_floats(value_line: str) -> List[float]:
+    """
+    Parse a whitespace-separated result row: str.split() plus float() on each
+    token, which for a handful of tokens beats both regex scanning and a NumPy
+    round trip. Falls back to FLOAT_RE if a token is not a plain number or
+    there are fewer than 3 of them.
+    """
+    try:
+        nums = list(map(float, value_line.split()))
+    except ValueError:
+        nums = []
+    if len(nums) < 3:
+        nums = [float(x) for x in FLOAT_RE.findall(value_line)]
+    return nums
+
+def parse_pre_block(html_bytes: bytes) -> Dict[str, float]:
     """
     Parse the INSPECT results from the <pre> block into a dict.
 
@@ -185,8 +507,8 @@ def parse_pre_block(html: str) -> Dict[str, float]:
     Typical nonlte_from_lte block:
         A(LTE) A(NLTE) Delta [O/Fe] NLTE
     """
-    soup = BeautifulSoup(html, "html.parser")
-    pre = soup.find("pre")
+    # A plain regex is enough to cut out the one <pre> block; no DOM needed
+    pre = PRE_RE.search(html_bytes)
     if not pre:
         sys.stderr.write(
             "\nERROR: No results block (<pre>) found.\n"
@@ -196,21 +518,32 @@ def parse_pre_block(html: str) -> Dict[str, float]:
         )
         sys.exit(1)   # exit immediately with error code
 
-    text = pre.get_text("\n", strip=True)
-    lines = [ln for ln in text.splitlines() if ln.strip()]
-    if not lines:
-        raise RuntimeError("Empty results block.")
-
-    # Heuristic: last line with numbers holds the values
-    value_line = next((ln for ln in reversed(lines) if FLOAT_RE.search(ln)), None)
-    if value_line is None:
-        raise RuntimeError("Could not locate numeric result line.")
-
-    nums = [float(x) for x in FLOAT_RE.findall(value_line)]
-    header = "\n".join(lines[:2]).lower()
+    block = pre.group(1)
+    nums = None
+    rows = ROW_RE.findall(block)
+    if rows:
+        # Fast path: the last all-numeric row, taken straight from the raw bytes
+        value_line = rows[-1].decode("ascii")
+        nums = row_floats(value_line)
+        is_ew = b"ew" in block[:200].lower()
+
+    if nums is None:
+        # Slow path: values wrapped in markup or mixed with text
+        text = html.unescape(TAG_RE.sub("", block.decode("utf-8", "replace")))
+        lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+        if not lines:
+            raise RuntimeError("Empty results block.")
+
+        # Heuristic: last line with numbers holds the values
+        value_line = next((ln for ln in reversed(lines) if FLOAT_RE.search(ln)), None)
+        if value_line is None:
+            raise RuntimeError("Could not locate numeric result line.")
+
+        nums = row_floats(value_line)
+        is_ew = "ew" in "\n".join(lines[:2]).lower()
 
     # A_from_e typically yields 5 numbers: EW, A_LTE, A_NLTE, Delta, [O/Fe]_NLTE
-    if "ew" in header and len(nums) >= 5:
+    if is_ew and len(nums) >= 5:
         return {"EW_mA": nums[0], "A_LTE": nums[1], "A_NLTE": nums[2], "Delta": nums[3], "OFe_NLTE": nums[4]}
 
     # Fallbacks to handle slight format changes:
@@ -224,39 +557,149 @@ def parse_pre_block(html: str) -> Dict[str, float]:
     raise RuntimeError(f"Unrecognized numeric format in result line: {value_line}")
 
 # ---------- Core query functions ----------
-def query_A_from_e(element: str, ew_mA: float, teff: float, logg: float, feh: float, vt: float, wi: int,
-                   session: requests.Session) -> Dict[str, float]:
+PRE_END_RE = re.compile(rb"</pre\s*>", re.I)
+
+def read_until_pre_end(chunks: Iterator[bytes]) -> bytes:
     """
-    Query INSPECT's A_from_e calculator (EW -> abundance).
+    Collect streamed body chunks up to (and including) the closing </pre>.
+    The rest is drained but not kept, so the keep-alive connection can be reused.
     """
-    params = {
-        "element_name": element, "e": f"{ew_mA:g}",
+    buf = bytearray()
+    for chunk in chunks:
+        start = max(0, len(buf) - 6)   # "</pre>" may straddle two chunks
+        buf += chunk
+        if PRE_END_RE.search(buf, start):
+            break
+    for _ in chunks:
+        pass
+    return bytes(buf)
+
+def fetch_pre_bytes(session: requests.Session, url: str, params: Dict[str, str]) -> bytes:
+    """
+    GET `url` (streamed) and return the response body up to the closing </pre>.
+    `session` is a requests session or an httpx client from make_http2_client().
+    """
+    if httpx is not None and isinstance(session, httpx.Client):
+        with session.stream("GET", url, params=params, timeout=30) as r:
+            r.raise_for_status()
+            return read_until_pre_end(r.iter_bytes(4096))
+    with session.get(url, params=params, timeout=30, stream=True) as r:
+        r.raise_for_status()
+        return read_until_pre_end(r.iter_content(4096))
+
+def make_base_params(element: str, teff: float, logg: float, feh: float, vt: float, wi: int) -> Dict[str, str]:
+    """
+    Build the query parameters shared by every request in a batch
+    (everything except the per-value EW or A(LTE)).
+    """
+    return {
+        "element_name": element,
         "t": f"{teff:g}", "g": f"{logg:g}", "f": f"{feh:g}", "x": f"{vt:g}",
         "wi": str(wi),
     }
-    r = session.get(ENDPOINT_EW, params=params, timeout=30)
-    r.raise_for_status()
-    out = parse_pre_block(r.text)
+
+def query_A_from_e(ew_mA: float, base_params: Dict[str, str], session: requests.Session) -> Dict[str, float]:
+    """
+    Query INSPECT's A_from_e calculator (EW -> abundance).
+    `base_params` comes from make_base_params().
+    """
+    params = {**base_params, "e": f"{ew_mA:g}"}
+    out = parse_pre_block(fetch_pre_bytes(session, ENDPOINT_EW, params))
     out.update({"mode": "ew"})
     return out
 
-def query_nlte_from_lte(element: str, A_lte: float, teff: float, logg: float, feh: float, vt: float, wi: int,
-                        session: requests.Session) -> Dict[str, float]:
+def query_nlte_from_lte(A_lte: float, base_params: Dict[str, str], session: requests.Session) -> Dict[str, float]:
     """
     Query INSPECT's nonlte_from_lte calculator (LTE abundance -> NLTE).
+    `base_params` comes from make_base_params().
     """
-    params = {
-        "element_name": element, "A_lte": f"{A_lte:g}",
-        "t": f"{teff:g}", "g": f"{logg:g}", "f": f"{feh:g}", "x": f"{vt:g}",
-        "wi": str(wi),
-    }
-    r = session.get(ENDPOINT_LTE, params=params, timeout=30)
-    r.raise_for_status()
-    out = parse_pre_block(r.text)
+    params = {**base_params, "A_lte": f"{A_lte:g}"}
+    out = parse_pre_block(fetch_pre_bytes(session, ENDPOINT_LTE, params))
     out.update({"mode": "lte"})
     return out
 
+# ---------- Result cache ----------
+def result_key(mode: str, base_params: Dict[str, str], value: float) -> str:
+    """Cache key for one query: the site, the mode and every parameter sent to INSPECT."""
+    return json.dumps([BASE, mode, base_params, f"{value:g}"], sort_keys=True)
+
+def open_result_cache(path: Path = RESULTS_DB) -> Optional[sqlite3.Connection]:
+    """
+    Open (creating if needed) the sqlite cache of query results that persists
+    across runs. Returns None if it cannot be opened, or belongs to another
+    user; the run then simply queries everything.
+    """
+    try:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        con = sqlite3.connect(str(path))
+        if not owned_by_me(path.stat()):
+            con.close()
+            return None
+        con.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, json TEXT)")
+        return con
+    except (OSError, sqlite3.Error):
+        return None
+
+def cache_get(con: sqlite3.Connection, key: str) -> Optional[Dict[str, Union[str, float]]]:
+    """Cached result for `key`, or None."""
+    try:
+        row = con.execute("SELECT json FROM results WHERE key = ?", (key,)).fetchone()
+        return json_loads(row[0]) if row else None
+    except (sqlite3.Error, ValueError):
+        return None
+
+def cache_put(con: sqlite3.Connection, key: str, result: Dict[str, Union[str, float]]):
+    """Store a successful result; cache write failures are ignored."""
+    try:
+        with con:
+            con.execute("INSERT OR REPLACE INTO results (key, json) VALUES (?, ?)", (key, json_dumps(result).decode()))
+    except sqlite3.Error:
+        pass
+
 # ---------- IO helpers ----------
+def first_float(line: str) -> Optional[float]:
+    """
+    First number on a line: the leading whitespace-separated token if it is a
+    finite number, else the first FLOAT_RE match (e.g. "star1,65"), else None.
+    """
+    tokens = line.split(None, 1)
+    if not tokens:
+        return None
+    try:
+        v = float(tokens[0])
+        if math.isfinite(v):
+            return v
+    except ValueError:
+        pass
+    m = FLOAT_RE.search(line)
+    return float(m.group(0)) if m else None
+
+COMMENT_RE = re.compile(r"#|//")
+
+def parse_values(source) -> List[float]:
+    """
+    Take the first numeric token of each line of `source` (a path or a list of lines).
+
+    A plain numeric column is parsed in one np.loadtxt call. Anything loadtxt
+    rejects, e.g. labels or a text header, falls back to a per-line regex.
+    Either way # and // start comments, and non-finite values (nan, inf) are
+    skipped.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")   # loadtxt warns about empty input
+            arr = np.loadtxt(source, usecols=(0,), comments=("#", "//"), ndmin=1)
+        return arr[np.isfinite(arr)].tolist()
+    except ValueError:
+        pass
+    lines = Path(source).read_text().splitlines() if isinstance(source, (str, Path)) else source
+    vals: List[float] = []
+    for ln in lines:
+        v = first_float(COMMENT_RE.split(ln, 1)[0])
+        if v is not None:
+            vals.append(v)
+    return vals
+
 def read_values(args) -> List[float]:
     """
     Read numeric input values from --values, --values-file, and/or stdin.
@@ -265,49 +708,52 @@ def read_values(args) -> List[float]:
     if args.values:
         vals.extend(float(s.strip()) for s in args.values.split(",") if s.strip())
     if args.values_file:
-        p = Path(args.values_file)
-        for ln in p.read_text().splitlines():
-            ln = ln.strip()
-            if not ln:
-                continue
-            m = FLOAT_RE.search(ln)
-            if m:
-                vals.append(float(m.group(0)))
+        vals.extend(parse_values(args.values_file))
     if not sys.stdin.isatty():
-        for ln in sys.stdin:
-            ln = ln.strip()
-            if not ln:
-                continue
-            m = FLOAT_RE.search(ln)
-            if m:
-                vals.append(float(m.group(0)))
+        # Read stdin up front so the regex fallback can see the same lines
+        vals.extend(parse_values(sys.stdin.read().splitlines()))
     if not vals:
         raise SystemExit("No input values found. Use --values, --values-file, or pipe via stdin.")
     return vals
 
-def write_csv(rows: List[Dict[str, Union[str, float]]], out_path: Optional[str]):
-    """
-    Write rows to CSV at out_path, or to stdout if out_path is None.
-    """
-    if not rows:
-        print("No rows to write.", file=sys.stderr)
-        return
-    preferred = ["mode","element","wi","wavelength_A","Teff","logg","FeH","vt",
-                 "input_value","EW_mA","A_LTE","A_NLTE","Delta","OFe_NLTE","error"]
-    cols = set()
-    for r in rows:
-        cols.update(r.keys())
-    header = [c for c in preferred if c in cols] + [c for c in sorted(cols) if c not in preferred]
-    if out_path:
-        with open(out_path, "w", newline="") as f:
-            w = csv.DictWriter(f, fieldnames=header)
-            w.writeheader()
-            w.writerows(rows)
-        print(f"\nWrote {len(rows)} rows to {out_path}")
-    else:
-        w = csv.DictWriter(sys.stdout, fieldnames=header)
-        w.writeheader()
-        w.writerows(rows)
+class BufferedLog:
+    """
+    Progress printer that batches writes: pending lines are written (and the
+    stream flushed) every `every` lines or `interval` seconds, whichever
+    comes first, and whenever flush() is called.
+    """
+    def __init__(self, stream: TextIO, every: int = 16, interval: float = 0.1):
+        self.stream = stream
+        self.every = every
+        self.interval = interval
+        self.pending: List[str] = []
+        self.last = time.monotonic()
+
+    def line(self, *parts: str):
+        self.pending.append(" ".join(parts))
+        if len(self.pending) >= self.every or time.monotonic() - self.last >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.stream.write("\n".join(self.pending) + "\n")
+            self.pending.clear()
+        self.stream.flush()
+        self.last = time.monotonic()
+
+CSV_COLUMNS = ["mode","element","wi","wavelength_A","Teff","logg","FeH","vt",
+               "input_value","EW_mA","A_LTE","A_NLTE","Delta","OFe_NLTE","error"]
+
+def open_csv_writer(out_path: Optional[str]) -> Tuple[TextIO, csv.DictWriter]:
+    """
+    Open out_path (or stdout if None) and write the CSV header.
+    Returns (file, writer); rows are then written one by one as results arrive.
+    """
+    f = open(out_path, "w", newline="") if out_path else sys.stdout
+    w = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    w.writeheader()
+    f.flush()
+    return f, w
 
 # ---------- Main ----------
 def main():
@@ -329,7 +775,21 @@ def main():
     ap.add_argument("--wi", type=int, help="INSPECT line index (alternative to --wavelength)")
 
     ap.add_argument("--out", help="Output CSV path (default: stdout)")
-    ap.add_argument("--sleep", type=float, default=0.2, help="Seconds to sleep between requests (default 0.2)")
+    ap.add_argument("--sleep", type=float, default=0.0,
+                    help="Minimum seconds each worker waits after a request (default 0: rely on "
+                         "--concurrency and the server's 429 responses)")
+    ap.add_argument("--concurrency", type=int, default=10,
+                    help="Number of queries in flight at once (default 10)")
+    ap.add_argument("--http2", action="store_true",
+                    help="Use HTTP/2 via httpx, multiplexing all queries over one connection "
+                         "(needs: pip install \"httpx[http2]\")")
+    ap.add_argument("--cache", action="store_true",
+                    help="Reuse (and store) results of identical queries from earlier runs "
+                         "in ~/.cache/abundatron/results.sqlite")
+    ap.add_argument("--pin-ip", action="store_true",
+                    help="Resolve the INSPECT host once at startup and connect to that IP for all queries")
+    ap.add_argument("--lines-ttl", type=float, default=LINES_CACHE_TTL,
+                    help="Seconds to reuse the cached line list for --element (default 86400; 0 = always refetch)")
     ap.add_argument("--quiet", action="store_true", help="Suppress per-item progress prints")
 
     args = ap.parse_args()
@@ -337,73 +797,167 @@ def main():
     # Ensure exactly one of wavelength or wi is set
     if (args.wavelength is None) == (args.wi is None):
         ap.error("Choose exactly one: --wavelength OR --wi")
+    if args.concurrency < 1:
+        ap.error("--concurrency must be at least 1")
+    if args.pin_ip and args.http2:
+        ap.error("--pin-ip is not supported together with --http2")
 
     values = read_values(args)
     total = len(values)
 
-    sess = make_session()
+    if args.http2:
+        try:
+            sess = make_http2_client(max_connections=args.concurrency)
+        except (RuntimeError, ImportError) as exc:   # httpx or its h2 extra missing
+            ap.error(str(exc))
+    else:
+        pinned_ip = None
+        if args.pin_ip:
+            host = urlsplit(BASE).hostname
+            try:
+                pinned_ip = socket.gethostbyname(host)
+            except OSError as exc:
+                raise SystemExit(f"Could not resolve {host}: {exc}")
+        sess = make_session(pool_size=args.concurrency, pinned_ip=pinned_ip)
     # Resolve wi and matched wavelength (for context in outputs)
     if args.wavelength is not None:
-        wi, matched_wav = choose_wi_from_wavelength(args.element, args.wavelength, sess)
+        wi, matched_wav = choose_wi_from_wavelength(args.element, args.wavelength, sess, args.lines_ttl)
     else:
         wi = int(args.wi)
-        lines = fetch_available_lines(args.element, sess)
+        lines = fetch_available_lines(args.element, sess, args.lines_ttl)
         wav_map = {widx: wav for (widx, wav, _) in lines}
         matched_wav = wav_map.get(wi, float("nan"))
 
-    rows: List[Dict[str, Union[str, float]]] = []
+    # Rows go to the CSV as soon as they are ready; keep progress off stdout if the CSV is there
+    out_f, writer = open_csv_writer(args.out)
+    log = sys.stdout if args.out else sys.stderr
+    progress = BufferedLog(log)
+    n_rows = 0
+
+    def emit(row: Dict[str, Union[str, float]]):
+        nonlocal n_rows
+        writer.writerow(row)
+        out_f.flush()   # partial results survive a Ctrl-C
+        n_rows += 1
 
     if not args.quiet:
-        print(f"Element={args.element}  mode={args.mode}  wi={wi}  λ≈{matched_wav} Å")
-        print(f"Teff={args.teff}  logg={args.logg}  [Fe/H]={args.feh}  vt={args.vt} km/s")
-        print(f"Total inputs: {total}\n")
+        print(f"Element={args.element}  mode={args.mode}  wi={wi}  λ≈{matched_wav} Å", file=log)
+        print(f"Teff={args.teff}  logg={args.logg}  [Fe/H]={args.feh}  vt={args.vt} km/s", file=log)
+        print(f"Total inputs: {total}\n", file=log)
+
+    # Everything but the input value is the same for the whole batch
+    base_params = make_base_params(args.element, args.teff, args.logg, args.feh, args.vt, wi)
+    query = query_A_from_e if args.mode == "ew" else query_nlte_from_lte
 
-    for i, v in enumerate(values, 1):
-        prefix = f"[{i}/{total}]"
+    def run_one(v: float) -> Dict[str, Union[str, float]]:
+        """Query INSPECT for a single input value (runs in a worker thread)."""
         try:
-            if args.mode == "ew":
-                res = query_A_from_e(args.element, ew_mA=v, teff=args.teff, logg=args.logg,
-                                     feh=args.feh, vt=args.vt, wi=wi, session=sess)
+            return query(v, base_params, sess)
+        finally:
+            # Only throttle when asked to; retries already back off on 429s
+            if args.sleep > 0:
+                time.sleep(args.sleep)
+
+    # Each distinct query runs once: duplicates in the batch share a future,
+    # and with --cache results from earlier runs come straight from the sqlite store
+    cache = open_result_cache() if args.cache else None
+    keys = [result_key(args.mode, base_params, v) for v in values]
+    remaining = Counter(keys)           # rows still to be written per key
+    inflight: Dict[str, Future] = {}    # only keys inside the look-ahead window or needed again later
+    queried = set()                     # keys answered by INSPECT rather than the cache
+    window = 2 * args.concurrency
+    next_submit = 0
+
+    def submit_ahead(i: int):
+        """Queue queries for the inputs up to `window` rows ahead of row i."""
+        nonlocal next_submit
+        while next_submit < min(total, i + window):
+            key, v = keys[next_submit], values[next_submit]
+            next_submit += 1
+            if key in inflight:
+                continue
+            hit = cache_get(cache, key) if cache else None
+            if hit is not None:
+                inflight[key] = Future()
+                inflight[key].set_result(hit)
             else:
-                res = query_nlte_from_lte(args.element, A_lte=v, teff=args.teff, logg=args.logg,
-                                          feh=args.feh, vt=args.vt, wi=wi, session=sess)
-
-            # Enrich with context & input value
-            res.update({
-                "element": args.element, "wi": wi, "wavelength_A": matched_wav,
-                "Teff": args.teff, "logg": args.logg, "FeH": args.feh, "vt": args.vt,
-                "input_value": v,
-            })
-            rows.append(res)
-
-            if not args.quiet:
-                # Print a compact human-readable line with key fields
-                a_lte  = res.get("A_LTE")
-                a_nlte = res.get("A_NLTE")
-                delta  = res.get("Delta")
-                ofe    = res.get("OFe_NLTE")
-                # Build a short status string depending on available keys
-                bits = [f"mode={res['mode']}", f"val={v:g}"]
-                if a_lte  is not None:  bits.append(f"A_LTE={a_lte:.3f}")
-                if a_nlte is not None:  bits.append(f"A_NLTE={a_nlte:.3f}")
-                if delta  is not None:  bits.append(f"Δ={delta:+.3f}")
-                if ofe    is not None:  bits.append(f"[O/Fe]_NLTE={ofe:+.3f}")
-                print(prefix, " ".join(bits), "… DONE", flush=True)
-
-        except Exception as exc:
-            err_row = {
-                "mode": args.mode, "element": args.element, "wi": wi, "wavelength_A": matched_wav,
-                "Teff": args.teff, "logg": args.logg, "FeH": args.feh, "vt": args.vt,
-                "input_value": v, "error": str(exc)[:300],
-            }
-            rows.append(err_row)
-            if not args.quiet:
-                print(prefix, f"val={v:g} … ERROR: {err_row['error']}", flush=True)
-
-        time.sleep(args.sleep)
-
-    # Final CSV
-    write_csv(rows, args.out)
+                inflight[key] = pool.submit(run_one, v)
+                queried.add(key)
+
+    def finish():
+        """Flush progress, close the result cache and the CSV file."""
+        progress.flush()
+        if cache:
+            cache.close()
+        if args.out:
+            out_f.close()
+            print(f"\nWrote {n_rows} rows to {args.out}")
+        else:
+            out_f.flush()
+
+    # Fan the queries out over a bounded pool; results are collected in input order
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    try:
+        for i, (key, v) in enumerate(zip(keys, values), 1):
+            prefix = f"[{i}/{total}]"
+            submit_ahead(i - 1)
+            fut = inflight[key]
+            remaining[key] -= 1
+            if not remaining[key]:
+                del inflight[key]   # last row for this key: let the result go
+            try:
+                if not fut.done():
+                    progress.flush()   # about to wait: show what is done so far
+                res = dict(fut.result())
+                if cache and key in queried:
+                    cache_put(cache, key, res)
+                    queried.discard(key)
+
+                # Enrich with context & input value
+                res.update({
+                    "element": args.element, "wi": wi, "wavelength_A": matched_wav,
+                    "Teff": args.teff, "logg": args.logg, "FeH": args.feh, "vt": args.vt,
+                    "input_value": v,
+                })
+                emit(res)
+
+                if not args.quiet:
+                    # Print a compact human-readable line with key fields
+                    a_lte  = res.get("A_LTE")
+                    a_nlte = res.get("A_NLTE")
+                    delta  = res.get("Delta")
+                    ofe    = res.get("OFe_NLTE")
+                    # Build a short status string depending on available keys
+                    bits = [f"mode={res['mode']}", f"val={v:g}"]
+                    if a_lte  is not None:  bits.append(f"A_LTE={a_lte:.3f}")
+                    if a_nlte is not None:  bits.append(f"A_NLTE={a_nlte:.3f}")
+                    if delta  is not None:  bits.append(f"Δ={delta:+.3f}")
+                    if ofe    is not None:  bits.append(f"[O/Fe]_NLTE={ofe:+.3f}")
+                    progress.line(prefix, " ".join(bits), "… DONE")
+
+            except Exception as exc:
+                err_row = {
+                    "mode": args.mode, "element": args.element, "wi": wi, "wavelength_A": matched_wav,
+                    "Teff": args.teff, "logg": args.logg, "FeH": args.feh, "vt": args.vt,
+                    "input_value": v, "error": str(exc)[:300],
+                }
+                emit(err_row)
+                if not args.quiet:
+                    progress.line(prefix, f"val={v:g} … ERROR: {err_row['error']}")
+    except (KeyboardInterrupt, SystemExit) as exc:
+        # Ctrl-C or a fatal parse error: keep the rows written so far and leave at once.
+        # Running workers cannot be cancelled and may sit in retries for minutes, and
+        # a normal exit would join them, so flush everything and skip interpreter shutdown.
+        for fut in inflight.values():
+            fut.cancel()
+        finish()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if isinstance(exc, KeyboardInterrupt):
+            os._exit(130)
+        os._exit(exc.code if isinstance(exc.code, int) else 1)
+    pool.shutdown(wait=True)
+    finish()
 
 if __name__ == "__main__":
     main()